@@ -0,0 +1,104 @@
+"""
+Minimal ctypes binding to libespeak-ng.
+
+Keeps a single initialised espeak-ng engine per process, so reference audio
+for a lyric line costs one FFI call instead of forking an espeak-ng process.
+Used by espeak_ng_tts.py when the aeneas cew C extension is not available.
+"""
+import ctypes
+import ctypes.util
+import threading
+from typing import Optional
+
+# Constants from espeak-ng/speak_lib.h
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+POS_CHARACTER = 1
+ESPEAK_CHARS_UTF8 = 1
+EE_OK = 0
+
+# int SynthCallback(short *wav, int numsamples, espeak_EVENT *events)
+SYNTH_CALLBACK = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p
+)
+
+
+def find_library() -> Optional[str]:
+    """Return the path of the libespeak-ng shared library, or None if it is not installed."""
+    return ctypes.util.find_library("espeak-ng")
+
+
+class EspeakNG:
+    """
+    In-process espeak-ng synthesizer.
+
+    Each Aeneas worker process initialises its own engine on first use.
+    libespeak-ng keeps global state, so the lock serialises synthesis calls
+    from different threads within that one process.
+    """
+
+    def __init__(self, library_path: str):
+        lib = ctypes.CDLL(library_path)
+        lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        lib.espeak_Initialize.restype = ctypes.c_int
+        lib.espeak_SetSynthCallback.argtypes = [SYNTH_CALLBACK]
+        lib.espeak_SetSynthCallback.restype = None
+        lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        lib.espeak_SetVoiceByName.restype = ctypes.c_int
+        lib.espeak_Synth.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_uint, ctypes.c_uint, ctypes.POINTER(ctypes.c_uint), ctypes.c_void_p
+        ]
+        lib.espeak_Synth.restype = ctypes.c_int
+        lib.espeak_Synchronize.argtypes = []
+        lib.espeak_Synchronize.restype = ctypes.c_int
+
+        self.sample_rate = lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+        if self.sample_rate <= 0:
+            raise RuntimeError("espeak_Initialize failed")
+
+        # Keep a reference to the callback so it is not garbage collected
+        self._callback = SYNTH_CALLBACK(self._on_samples)
+        lib.espeak_SetSynthCallback(self._callback)
+
+        self._lib = lib
+        self._lock = threading.Lock()
+        self._voice = None
+        self._buffer = bytearray()
+
+    def _on_samples(self, wav, numsamples, events):
+        if numsamples > 0:
+            self._buffer += ctypes.string_at(wav, numsamples * ctypes.sizeof(ctypes.c_short))
+        return 0  # continue synthesis
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        """Synthesize text and return mono 16-bit PCM at self.sample_rate."""
+        data = text.encode("utf-8") + b"\0"
+        with self._lock:
+            if voice != self._voice:
+                if self._lib.espeak_SetVoiceByName(voice.encode("ascii")) != EE_OK:
+                    raise RuntimeError(f"espeak-ng voice not available: {voice}")
+                self._voice = voice
+            self._buffer = bytearray()
+            status = self._lib.espeak_Synth(
+                data, len(data), 0, POS_CHARACTER, 0, ESPEAK_CHARS_UTF8, None, None
+            )
+            if status != EE_OK:
+                raise RuntimeError(f"espeak_Synth failed with status {status}")
+            self._lib.espeak_Synchronize()
+            return bytes(self._buffer)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> EspeakNG:
+    """Return the process-wide engine, initialising libespeak-ng on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            library_path = find_library()
+            if library_path is None:
+                raise OSError("libespeak-ng shared library not found")
+            _engine = EspeakNG(library_path)
+    return _engine
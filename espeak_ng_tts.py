@@ -0,0 +1,55 @@
+"""
+Aeneas custom TTS wrapper backed by the in-process libespeak-ng engine.
+
+Aeneas loads this file from its path (tts=custom, tts_path=<this file>) for
+every synthesis, so it must define CustomTTSWrapper and keep no state of its
+own. The engine lives in espeak_ng, which is imported normally and therefore
+initialised only once per process.
+"""
+import wave
+
+import numpy
+from aeneas.exacttiming import TimeValue
+from aeneas.language import Language
+from aeneas.ttswrappers.basettswrapper import BaseTTSWrapper
+
+from espeak_ng import get_engine
+
+
+class CustomTTSWrapper(BaseTTSWrapper):
+    """Synthesize Japanese reference audio through libespeak-ng via ctypes."""
+
+    JPN = Language.JPN
+
+    LANGUAGE_TO_VOICE_CODE = {JPN: "ja"}
+    CODE_TO_HUMAN = {JPN: u"Japanese"}
+    CODE_TO_HUMAN_LIST = sorted([u"%s\t%s" % (k, v) for k, v in CODE_TO_HUMAN.items()])
+    DEFAULT_LANGUAGE = JPN
+
+    OUTPUT_AUDIO_FORMAT = ("pcm_s16le", 1, 22050)
+
+    HAS_PYTHON_CALL = True
+
+    TAG = u"LibEspeakNGTTSWrapper"
+
+    def __init__(self, rconf=None, logger=None):
+        super(CustomTTSWrapper, self).__init__(rconf=rconf, logger=logger)
+        self.engine = get_engine()
+
+    def _synthesize_single_python_helper(self, text, voice_code, output_file_path=None, return_audio_data=True):
+        pcm = self.engine.synthesize(text, voice_code) if len(text) > 0 else b""
+        sample_rate = self.engine.sample_rate
+
+        if output_file_path is not None:
+            with wave.open(output_file_path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(sample_rate)
+                f.writeframes(pcm)
+
+        if not return_audio_data:
+            return (True, None)
+
+        samples = numpy.frombuffer(pcm, dtype=numpy.int16).astype(numpy.float64) / 32768
+        duration = TimeValue(len(samples) / sample_rate)
+        return (True, (duration, sample_rate, "pcm16", samples))
@@ -1,16 +1,186 @@
+import asyncio
+import contextlib
+import hashlib
+import importlib
+import multiprocessing
 import os
 import sys
 import subprocess
-import urllib.request
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
 
+import diskcache
+import httpx
+import orjson
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, HttpUrl, field_validator
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, HttpUrl, field_validator
 
-app = FastAPI(title="Japanese Lyrics Alignment Service")
+import espeak_ng
+
+# Aeneas is imported once at module load and reused for every request.
+# A missing install is reported by check_dependencies() at startup.
+try:
+    from aeneas.exacttiming import TimeValue
+    from aeneas.executetask import ExecuteTask
+    from aeneas.runtimeconfiguration import RuntimeConfiguration as RConf
+    from aeneas.syncmap.fragment import SyncMapFragment
+    from aeneas.task import Task
+except ImportError:
+    ExecuteTask = RConf = SyncMapFragment = Task = TimeValue = None
+
+AENEAS_TASK_CONFIG = "task_language=jpn|is_text_type=plain"
+
+# C extensions that must be compiled for aeneas to run at native speed.
+# aeneas.cfw (Festival) is left out because the service only uses espeak-ng.
+AENEAS_C_EXTENSIONS = ("aeneas.cdtw.cdtw", "aeneas.cmfcc.cmfcc")
+
+# aeneas.cew is preferred for espeak-ng synthesis; without it the service falls
+# back to its own libespeak-ng binding, loaded by aeneas as a custom TTS wrapper
+AENEAS_CEW_EXTENSION = "aeneas.cew.cew"
+ESPEAK_NG_TTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "espeak_ng_tts.py")
+
+
+def has_cew_extension() -> bool:
+    """Return True if the aeneas cew C extension can be imported."""
+    try:
+        importlib.import_module(AENEAS_CEW_EXTENSION)
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_tmp_root() -> str:
+    """
+    Pick the directory for per-request temporary files.
+    
+    KARAOKE_TMP is used as given when it is set and writable. Otherwise a
+    memory-backed tmpfs (/dev/shm) keeps the WAV and lyrics files off block
+    storage, but only when it has at least KARAOKE_SHM_MIN_FREE bytes free:
+    Docker caps /dev/shm at 64 MB by default, which a single long song or a
+    few concurrent requests would exhaust. Everything else falls back to /tmp.
+    """
+    tmp_root = os.environ.get("KARAOKE_TMP")
+    if tmp_root and os.path.isdir(tmp_root) and os.access(tmp_root, os.W_OK):
+        return tmp_root
+    
+    shm_min_free = int(os.environ.get("KARAOKE_SHM_MIN_FREE", 128 * 1024 * 1024))
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        stats = os.statvfs("/dev/shm")
+        if stats.f_bavail * stats.f_frsize >= shm_min_free:
+            return "/dev/shm"
+    return "/tmp"
+
+
+TMP_ROOT = resolve_tmp_root()
+
+# Upper bound on downloaded audio size, and the content types accepted as audio
+MAX_AUDIO_BYTES = int(os.environ.get("MAX_AUDIO_BYTES", 100 * 1024 * 1024))
+AUDIO_CONTENT_TYPES = ("audio/", "video/", "application/octet-stream", "application/ogg")
+
+
+def resolve_cache_dir() -> str:
+    """
+    Pick the directory of the persistent alignment cache.
+    
+    CACHE_DIR (default /var/cache/karaoke) is used when it exists or can be
+    created; non-root local runs fall back to ~/.cache/karaoke.
+    """
+    cache_dir = os.path.abspath(os.environ.get("CACHE_DIR", "/var/cache/karaoke"))
+    existing = cache_dir
+    while not os.path.exists(existing):
+        existing = os.path.dirname(existing)
+    if os.path.isdir(existing) and os.access(existing, os.W_OK):
+        return cache_dir
+    return os.path.join(os.path.expanduser("~"), ".cache", "karaoke")
+
+
+# Persistent cache of alignment results for repeated songs
+CACHE_DIR = resolve_cache_dir()
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Scratch directory for Aeneas temporary files
+AENEAS_TMP_PATH = os.environ.get("AENEAS_TMP_PATH", os.path.join(TMP_ROOT, "aeneas"))
+
+# Number of worker processes running alignments in parallel
+AENEAS_WORKERS = int(os.environ.get("AENEAS_WORKERS", os.cpu_count() or 1))
+
+# MFCC/DTW tuning; the DTW cost matrix dominates alignment memory and time.
+# Larger window shifts and a narrower stripe margin shrink it for long songs.
+AENEAS_MFCC_WINDOW_LENGTH = os.environ.get("AENEAS_MFCC_WINDOW_LENGTH", "0.100")
+AENEAS_MFCC_WINDOW_SHIFT = os.environ.get("AENEAS_MFCC_WINDOW_SHIFT", "0.040")
+AENEAS_MFCC_MASK_NONSPEECH = os.environ.get("AENEAS_MFCC_MASK_NONSPEECH", "true").lower() in ("1", "true", "yes")
+AENEAS_DTW_ALGORITHM = os.environ.get("AENEAS_DTW_ALGORITHM", "stripe")
+AENEAS_DTW_MARGIN = os.environ.get("AENEAS_DTW_MARGIN", "60.0")
+
+
+def build_runtime_configuration():
+    """
+    Build the Aeneas runtime configuration shared by every alignment.
+    
+    Synthesis goes through the cew C extension (or, failing that, the
+    libespeak-ng ctypes wrapper) inside this process rather than through one
+    espeak-ng subprocess per line. The TTS cache is only enabled for the
+    ctypes wrapper: aeneas consults it per line there, letting repeated lines
+    (choruses, refrains) reuse synthesized audio, whereas cew synthesizes all
+    lines in one C call and never reads the cache. Masking non-speech MFCC
+    frames and the stripe DTW keep the cost matrix small for songs with
+    instrumental breaks.
+    """
+    rconf = RConf()
+    rconf[RConf.C_EXTENSIONS] = True
+    rconf[RConf.CDTW] = True
+    rconf[RConf.CMFCC] = True
+    if has_cew_extension():
+        rconf[RConf.CEW] = True
+        rconf[RConf.CEW_SUBPROCESS_ENABLED] = False
+    else:
+        rconf[RConf.TTS] = "custom"
+        rconf[RConf.TTS_PATH] = ESPEAK_NG_TTS_PATH
+        rconf[RConf.TTS_CACHE] = True
+    rconf[RConf.TMP_PATH] = AENEAS_TMP_PATH
+    rconf[RConf.MFCC_WINDOW_LENGTH] = TimeValue(AENEAS_MFCC_WINDOW_LENGTH)
+    rconf[RConf.MFCC_WINDOW_SHIFT] = TimeValue(AENEAS_MFCC_WINDOW_SHIFT)
+    rconf[RConf.MFCC_MASK_NONSPEECH] = AENEAS_MFCC_MASK_NONSPEECH
+    rconf[RConf.DTW_ALGORITHM] = AENEAS_DTW_ALGORITHM
+    rconf[RConf.DTW_MARGIN] = TimeValue(AENEAS_DTW_MARGIN)
+    return rconf
+
+
+RCONF = build_runtime_configuration() if RConf is not None else None
+
+
+def alignment_settings_fingerprint() -> str:
+    """
+    Digest everything besides the audio and lyrics that affects alignment timings.
+    
+    It is part of every alignment cache key, so retuning MFCC/DTW settings,
+    switching TTS backend (cew or the ctypes fallback) or upgrading aeneas
+    never serves timings computed under the old setup.
+    """
+    if RCONF is None:
+        return "unconfigured"
+    import aeneas
+    settings = [aeneas.__version__, AENEAS_TASK_CONFIG]
+    for key in (
+        RConf.TTS, RConf.TTS_PATH, RConf.C_EXTENSIONS, RConf.CDTW, RConf.CMFCC, RConf.CEW,
+        RConf.MFCC_WINDOW_LENGTH, RConf.MFCC_WINDOW_SHIFT, RConf.MFCC_MASK_NONSPEECH,
+        RConf.DTW_ALGORITHM, RConf.DTW_MARGIN
+    ):
+        settings.append(f"{key}={RCONF[key]}")
+    return hashlib.blake2b("|".join(settings).encode("utf-8"), digest_size=8).hexdigest()
+
+
+ALIGNMENT_SETTINGS_FINGERPRINT = alignment_settings_fingerprint()
+
+app = FastAPI(title="Japanese Lyrics Alignment Service", default_response_class=ORJSONResponse)
 
 
 class AlignmentRequest(BaseModel):
+    # Lines are stripped once by pydantic-core during validation
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
     audio_url: HttpUrl
     lyrics: List[str]
     
@@ -18,20 +188,16 @@ class AlignmentRequest(BaseModel):
     @classmethod
     def validate_lyrics(cls, v):
         """Validate that lyrics is a list of individual lines, not a multiline string."""
-        if not isinstance(v, list):
-            raise ValueError("lyrics must be a list of strings")
         if not v:
             raise ValueError("lyrics cannot be empty")
-        for i, line in enumerate(v):
-            if not isinstance(line, str):
-                raise ValueError(f"lyrics[{i}] must be a string, got {type(line).__name__}")
-            # Check if it looks like a multiline string (contains newlines)
-            if '\n' in line:
-                raise ValueError(
-                    f"lyrics[{i}] appears to be a multiline string. "
-                    "Each item in lyrics should be a single line. "
-                    "Split multiline strings into separate list items."
-                )
+        # Check if any item looks like a multiline string (contains newlines)
+        bad = next((i for i, line in enumerate(v) if '\n' in line), None)
+        if bad is not None:
+            raise ValueError(
+                f"lyrics[{bad}] appears to be a multiline string. "
+                "Each item in lyrics should be a single line. "
+                "Split multiline strings into separate list items."
+            )
         return v
 
 
@@ -42,63 +208,274 @@ class AlignmentResult(BaseModel):
     end: float
 
 
-def download_audio(url: str, output_path: str) -> None:
-    """Download audio file from URL."""
+# MP4-family containers may keep their index (moov atom) at the end of the file,
+# which ffmpeg cannot reach on a non-seekable pipe; these are spooled to a file
+SEEKABLE_CONTENT_TYPES = ("audio/mp4", "audio/m4a", "audio/x-m4a", "video/mp4", "video/quicktime", "video/3gpp")
+SEEKABLE_SUFFIXES = (".mp4", ".m4a", ".m4b", ".mov", ".3gp")
+
+
+def needs_seekable_input(response: httpx.Response) -> bool:
+    """Return True if the audio must be read by ffmpeg from a file rather than a pipe."""
+    media_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type in SEEKABLE_CONTENT_TYPES:
+        return True
+    return response.url.path.lower().endswith(SEEKABLE_SUFFIXES)
+
+
+def ffmpeg_command(input_spec: str, output_path: str) -> List[str]:
+    """Build the ffmpeg command converting input_spec (a path or pipe:0) to mono 16kHz WAV."""
+    return [
+        "ffmpeg",
+        "-threads", "1",  # requests already run concurrently; don't oversubscribe cores
+        "-loglevel", "error",
+        "-i", input_spec,
+        "-vn",  # skip video decoding (e.g. MP4 sources)
+        "-ac", "1",  # mono
+        "-ar", "16000",  # 16kHz
+        "-sample_fmt", "s16",
+        "-c:a", "pcm_s16le",  # raw 16-bit PCM, which is all Aeneas needs
+        "-f", "wav",
+        "-y",  # overwrite output
+        output_path
+    ]
+
+
+async def iter_audio_body(response: httpx.Response, digest):
+    """Yield the response body in chunks, feeding `digest` and enforcing MAX_AUDIO_BYTES."""
+    received = 0
+    async for chunk in response.aiter_bytes(1 << 16):
+        # Content-Length may be missing or wrong, so enforce the limit while streaming too
+        received += len(chunk)
+        if received > MAX_AUDIO_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Audio file exceeds the {MAX_AUDIO_BYTES} byte limit"
+            )
+        digest.update(chunk)
+        yield chunk
+
+
+async def start_ffmpeg(input_spec: str, output_path: str, stdin) -> asyncio.subprocess.Process:
+    """Spawn ffmpeg for a conversion, mapping a missing binary to an HTTP error."""
     try:
-        urllib.request.urlretrieve(url, output_path)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to download audio: {str(e)}")
+        return await asyncio.create_subprocess_exec(
+            *ffmpeg_command(input_spec, output_path),
+            stdin=stdin,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=500,
+            detail="ffmpeg not found. Please install ffmpeg."
+        )
 
 
-def convert_audio_to_wav(input_path: str, output_path: str) -> None:
+def check_ffmpeg_result(returncode: int, stderr: bytes) -> None:
+    """Raise an HTTP error if ffmpeg failed."""
+    if returncode != 0:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Audio conversion failed: {stderr.decode(errors='replace')}"
+        )
+
+
+async def convert_audio_to_wav(response: httpx.Response, output_path: str, digest) -> None:
     """
-    Convert audio to mono 16kHz WAV using ffmpeg.
+    Convert a streamed HTTP audio body to mono 16kHz WAV using ffmpeg.
+    
+    The body is normally piped straight into ffmpeg's stdin, so only the
+    converted WAV ever touches the disk. MP4/M4A/MOV sources are spooled to a
+    temporary file first, since their index may sit at the end of the file.
+    Every chunk is also fed into `digest`.
     
     Why ffmpeg is required:
     - Aeneas requires audio in a specific format (mono, 16kHz WAV)
     - Input audio may be in various formats (MP3, WAV, etc.) and sample rates
     - ffmpeg handles format conversion and resampling reliably
     """
+    if needs_seekable_input(response):
+        source_path = output_path + ".src"
+        try:
+            with open(source_path, "wb") as f:
+                async for chunk in iter_audio_body(response, digest):
+                    f.write(chunk)
+            proc = await start_ffmpeg(source_path, output_path, asyncio.subprocess.DEVNULL)
+            try:
+                _, stderr = await proc.communicate()
+            except BaseException:
+                # Request was cancelled; don't leave ffmpeg behind
+                proc.kill()
+                await proc.wait()
+                raise
+        finally:
+            remove_temp_file(source_path)
+        check_ffmpeg_result(proc.returncode, stderr)
+        return
+    
+    proc = await start_ffmpeg("pipe:0", output_path, asyncio.subprocess.PIPE)
+    
+    # Drain stderr concurrently so a chatty ffmpeg can never block on a full pipe
+    stderr_task = asyncio.create_task(proc.stderr.read())
     try:
-        cmd = [
-            "ffmpeg",
-            "-i", input_path,
-            "-ac", "1",  # mono
-            "-ar", "16000",  # 16kHz
-            "-y",  # overwrite output
-            output_path
-        ]
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
+        async for chunk in iter_audio_body(response, digest):
+            proc.stdin.write(chunk)
+            await proc.stdin.drain()
+        proc.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg exited early (e.g. unrecognised input); report its stderr below
+        pass
+    except BaseException:
+        # Download failed, was too large or the request was cancelled; don't leave ffmpeg behind
+        proc.kill()
+        await proc.wait()
+        stderr_task.cancel()
+        raise
+    
+    stderr = await stderr_task
+    check_ffmpeg_result(await proc.wait(), stderr)
+
+
+def validate_audio_response(response: httpx.Response) -> None:
+    """Reject responses that are too large or not audio before any of the body is read."""
+    content_length = response.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > MAX_AUDIO_BYTES:
         raise HTTPException(
-            status_code=500,
-            detail=f"Audio conversion failed: {e.stderr}"
+            status_code=413,
+            detail=f"Audio file too large: {content_length} bytes (limit {MAX_AUDIO_BYTES})"
         )
-    except FileNotFoundError:
+    
+    content_type = response.headers.get("content-type", "")
+    # Media types are case-insensitive and may carry parameters (e.g. "; codecs=opus")
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type and not media_type.startswith(AUDIO_CONTENT_TYPES):
         raise HTTPException(
-            status_code=500,
-            detail="ffmpeg not found. Please install ffmpeg."
+            status_code=415,
+            detail=f"URL does not point to audio (Content-Type: {content_type})"
         )
 
 
+async def fetch_and_convert(
+    client: httpx.AsyncClient,
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None
+) -> Optional[Tuple[str, httpx.Headers]]:
+    """
+    Download audio from URL and convert it to mono 16kHz WAV in a single pass.
+    
+    Returns a digest of the downloaded bytes (the alignment cache key) and the
+    response headers, or None if a conditional request got 304 Not Modified.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        async with client.stream("GET", url, headers=headers) as response:
+            # A 304 is only meaningful as the answer to our conditional headers;
+            # otherwise raise_for_status turns it into a download failure
+            if response.status_code == 304 and headers:
+                return None
+            response.raise_for_status()
+            validate_audio_response(response)
+            await convert_audio_to_wav(response, output_path, digest)
+            return digest.hexdigest(), response.headers
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=400, detail=f"Failed to download audio: {str(e)}")
+
+
+def remove_temp_file(path: str) -> None:
+    """Delete a temporary file, ignoring files that were never created."""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass  # Ignore cleanup errors
+
+
 def write_lyrics_file(lyrics: List[str], output_path: str) -> None:
     """Write lyrics to a text file, one line per lyric."""
     if not lyrics:
         raise HTTPException(status_code=400, detail="Lyrics array cannot be empty")
     
     with open(output_path, "w", encoding="utf-8") as f:
-        for line in lyrics:
-            f.write(line.strip() + "\n")
+        f.write("\n".join(lyrics) + "\n")
+
+
+def conditional_headers(validators: Dict[str, str]) -> Dict[str, str]:
+    """Build conditional GET headers from the validators stored for an audio URL."""
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def cached_alignment_results(lyrics: List[str], cached: bytes) -> List[AlignmentResult]:
+    """Rebuild alignment results from cached timings and the request's lyrics."""
+    return [
+        AlignmentResult(line_index=idx + 1, text=line, start=start, end=end)
+        for idx, (line, (start, end)) in enumerate(zip(lyrics, orjson.loads(cached)))
+    ]
+
+
+def alignment_cache_key(audio_digest: str, lyrics: List[str]) -> str:
+    """
+    Build the alignment cache key from the alignment settings, the audio digest
+    and the (already stripped) lyrics.
+    """
+    lyrics_digest = hashlib.blake2b("\n".join(lyrics).encode("utf-8"), digest_size=16).hexdigest()
+    return f"{ALIGNMENT_SETTINGS_FINGERPRINT}:{audio_digest}:{lyrics_digest}"
+
+
+def _run_aeneas_sync(audio_path: str, text_path: str) -> List[Tuple[float, float]]:
+    """
+    Execute an Aeneas task and return (begin, end) for each regular fragment (blocking).
+    
+    Runs in an Aeneas worker process, so only plain floats are sent back.
+    """
+    task = Task(config_string=AENEAS_TASK_CONFIG)
+    task.audio_file_path_absolute = audio_path
+    task.text_file_path_absolute = text_path
+    ExecuteTask(task, rconf=RCONF).execute()
+    # Only regular fragments map to lyric lines; head/tail silence is skipped
+    return [
+        (float(fragment.begin), float(fragment.end))
+        for fragment in task.sync_map_leaves(SyncMapFragment.REGULAR)
+    ]
+
+
+def _init_aeneas_worker() -> None:
+    """Prepare a freshly spawned Aeneas worker process."""
+    os.makedirs(AENEAS_TMP_PATH, exist_ok=True)
+
+
+def create_aeneas_pool() -> ProcessPoolExecutor:
+    """
+    Create the pool of worker processes that run alignments.
+    
+    aeneas's C extensions never release the GIL, so threads would serialize
+    alignments and stall the event loop; separate processes run them in
+    parallel. "spawn" avoids forking the server's event loop and HTTP client.
+    """
+    # Workers re-import this module and would otherwise re-resolve the temp
+    # root on their own, possibly picking /tmp while request files already
+    # fill /dev/shm; pin them to the paths the server resolved at startup
+    os.environ["KARAOKE_TMP"] = TMP_ROOT
+    os.environ["AENEAS_TMP_PATH"] = AENEAS_TMP_PATH
+    return ProcessPoolExecutor(
+        max_workers=AENEAS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_aeneas_worker
+    )
 
 
-def run_aeneas_alignment(audio_path: str, text_path: str, output_path: str) -> None:
+async def run_aeneas_alignment(audio_path: str, text_path: str, lyrics: List[str]) -> List[AlignmentResult]:
     """
-    Run Aeneas forced alignment for Japanese text.
+    Run Aeneas forced alignment for Japanese text and return alignment results.
+    
+    The sync map is read straight from the in-memory task, so no JSON file is
+    written or parsed along the way. Alignment is CPU-bound and the aeneas C
+    extensions hold the GIL, so it runs on the Aeneas process pool rather than
+    on a thread, keeping the event loop free and using more than one core.
     
     Why espeak-ng is required:
     - Aeneas uses a TTS (text-to-speech) engine to generate reference audio
@@ -111,84 +488,41 @@ def run_aeneas_alignment(audio_path: str, text_path: str, output_path: str) -> N
     - The TTS engine must be accessible via system PATH
     - Python bindings alone are not sufficient - the underlying C libraries are needed
     """
+    loop = asyncio.get_running_loop()
+    pool = app.state.aeneas_pool
     try:
-        # Use sys.executable to ensure we use the same Python interpreter
-        # This is critical - using "python" may point to a different interpreter
-        # that doesn't have aeneas installed
-        cmd = [
-            sys.executable, "-m", "aeneas.tools.execute_task",
-            audio_path,
-            text_path,
-            "task_language=jpn|os_task_file_format=json|is_text_type=plain",
-            output_path
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Aeneas alignment failed: {e.stderr}"
-        )
-    except FileNotFoundError:
+        fragments = await loop.run_in_executor(pool, _run_aeneas_sync, audio_path, text_path)
+    except BrokenProcessPool as e:
+        # A worker died (e.g. OOM-killed on a long song), which breaks the whole
+        # pool; replace it once so later requests recover, and fail this one
+        if app.state.aeneas_pool is pool:
+            app.state.aeneas_pool = create_aeneas_pool()
+            pool.shutdown(wait=False, cancel_futures=True)
         raise HTTPException(
             status_code=500,
-            detail="Aeneas not found. Please install aeneas."
+            detail=f"Aeneas worker process died: {str(e)}"
         )
-
-
-def parse_aeneas_output(output_path: str, lyrics: List[str]) -> List[AlignmentResult]:
-    """Parse Aeneas JSON output and return alignment results."""
-    import json
-    
-    try:
-        with open(output_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to parse Aeneas output: {str(e)}"
+            detail=f"Aeneas alignment failed: {str(e)}"
         )
     
-    results = []
-    fragments = data.get("fragments", [])
-    
     if len(fragments) != len(lyrics):
         raise HTTPException(
             status_code=500,
             detail=f"Alignment mismatch: {len(fragments)} fragments for {len(lyrics)} lyrics"
         )
     
-    for idx, fragment in enumerate(fragments):
-        # Try fragment-level begin/end first
-        if "begin" in fragment and "end" in fragment:
-            start = float(fragment["begin"])
-            end = float(fragment["end"])
-        else:
-            # Fall back to lines
-            lines = fragment.get("lines", [])
-            if not lines:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Fragment {idx + 1} has no timing information"
-                )
-            first_line = lines[0]
-            last_line = lines[-1]
-            start = float(first_line.get("begin", 0))
-            end = float(last_line.get("end", 0))
-        
-        results.append(AlignmentResult(
+    return [
+        AlignmentResult(
             line_index=idx + 1,  # 1-based index
             text=lyrics[idx],
             start=start,
             end=end
-        ))
-    
-    return results
+        )
+        for idx, (start, end) in enumerate(fragments)
+    ]
 
 
 @app.post("/align", response_model=List[AlignmentResult])
@@ -201,51 +535,76 @@ async def align_lyrics(request: AlignmentRequest):
     - Aligns lyrics using Aeneas
     - Returns timing information for each lyric line
     """
-    # Use /tmp directory for temporary files
-    temp_dir = "/tmp"
+    # Use the (preferably memory-backed) temp root for temporary files
+    temp_dir = TMP_ROOT
     
     # Generate unique filenames
     import uuid
     unique_id = str(uuid.uuid4())
     
-    downloaded_audio = os.path.join(temp_dir, f"audio_{unique_id}")
     converted_audio = os.path.join(temp_dir, f"converted_{unique_id}.wav")
     lyrics_file = os.path.join(temp_dir, f"lyrics_{unique_id}.txt")
-    alignment_output = os.path.join(temp_dir, f"alignment_{unique_id}.json")
     
-    try:
-        # Download audio
-        download_audio(str(request.audio_url), downloaded_audio)
-        
-        # Convert to mono 16kHz WAV
-        convert_audio_to_wav(downloaded_audio, converted_audio)
-        
-        # Write lyrics to file
-        write_lyrics_file(request.lyrics, lyrics_file)
-        
-        # Run Aeneas alignment
-        run_aeneas_alignment(converted_audio, lyrics_file, alignment_output)
+    with contextlib.ExitStack() as stack:
+        # Temporary files are removed on exit, whether or not they were created
+        stack.callback(remove_temp_file, converted_audio)
+        stack.callback(remove_temp_file, lyrics_file)
         
-        # Parse results
-        results = parse_aeneas_output(alignment_output, request.lyrics)
-        
-        return results
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Unexpected error: {str(e)}"
-        )
-    finally:
-        # Clean up temporary files
-        for file_path in [downloaded_audio, converted_audio, lyrics_file, alignment_output]:
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception:
-                pass  # Ignore cleanup errors
+        try:
+            audio_url = str(request.audio_url)
+            cache = app.state.alignment_cache
+            
+            # If this URL was aligned before with the same lyrics, revalidate it with
+            # a conditional GET instead of downloading the audio again
+            validators = cache.get(f"url:{audio_url}")
+            cached = None
+            if validators is not None:
+                cached = cache.get(alignment_cache_key(validators["audio_digest"], request.lyrics))
+            headers = conditional_headers(validators) if cached is not None else None
+            
+            # Download audio and convert to mono 16kHz WAV in a single pass, writing
+            # the lyrics file alongside it since the two stages are independent.
+            # Both are awaited to completion so cleanup never races a pending write.
+            fetched, lyrics_written = await asyncio.gather(
+                fetch_and_convert(app.state.http, audio_url, converted_audio, headers),
+                asyncio.to_thread(write_lyrics_file, request.lyrics, lyrics_file),
+                return_exceptions=True
+            )
+            for outcome in (fetched, lyrics_written):
+                if isinstance(outcome, BaseException):
+                    raise outcome
+            if fetched is None:
+                return cached_alignment_results(request.lyrics, cached)
+            audio_digest, response_headers = fetched
+            
+            # Remember the validators so the next request for this URL can be conditional
+            if "etag" in response_headers or "last-modified" in response_headers:
+                cache.set(f"url:{audio_url}", {
+                    "etag": response_headers.get("etag"),
+                    "last_modified": response_headers.get("last-modified"),
+                    "audio_digest": audio_digest,
+                })
+            
+            # Serve repeated (audio, lyrics) pairs from the cache without running Aeneas
+            cache_key = alignment_cache_key(audio_digest, request.lyrics)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached_alignment_results(request.lyrics, cached)
+            
+            # Run Aeneas alignment
+            results = await run_aeneas_alignment(converted_audio, lyrics_file, request.lyrics)
+            
+            # Only timings are cached; text always comes from the request
+            cache.set(cache_key, orjson.dumps([[result.start, result.end] for result in results]))
+            return results
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Unexpected error: {str(e)}"
+            )
 
 
 def check_dependencies():
@@ -288,11 +647,52 @@ def check_dependencies():
     # Check aeneas Python module
     try:
         import aeneas
-        # Try to import the execute_task module specifically
-        from aeneas.tools import execute_task
+        # Try to import the modules used for in-process alignment specifically
+        from aeneas.executetask import ExecuteTask
+        from aeneas.task import Task
     except ImportError as e:
         errors.append(f"aeneas Python module not found. Install with: pip3 install aeneas. Error: {str(e)}")
     
+    # Check the aeneas C extensions
+    # Without them aeneas silently falls back to pure-Python MFCC/DTW and to one
+    # espeak-ng subprocess per lyric line, which is orders of magnitude slower
+    for module_name in AENEAS_C_EXTENSIONS:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            errors.append(
+                f"{module_name} C extension not available. Install gcc and libespeak-ng-dev "
+                "(apt-get install gcc libespeak-ng-dev), then rebuild aeneas from source with: "
+                f"AENEAS_WITH_CEW=True pip install aeneas --no-binary :all:. Error: {str(e)}"
+            )
+    
+    # Check in-process espeak-ng synthesis: aeneas.cew, or libespeak-ng via ctypes
+    use_cew = has_cew_extension()
+    if use_cew:
+        # Ask aeneas's own espeak wrapper whether it will take the cew path
+        # under the shared runtime configuration
+        from aeneas.ttswrappers.espeakttswrapper import ESPEAKTTSWrapper
+        has_c_extension_call = bool(
+            ESPEAKTTSWrapper.HAS_C_EXTENSION_CALL
+            and RCONF[RConf.TTS] == "espeak"
+            and RCONF[RConf.C_EXTENSIONS]
+            and RCONF[RConf.CEW]
+        )
+        if not has_c_extension_call:
+            errors.append(
+                f"{AENEAS_CEW_EXTENSION} is installed but the aeneas espeak wrapper will not use it "
+                "with the current runtime configuration"
+            )
+    else:
+        try:
+            espeak_ng.get_engine()
+        except (OSError, RuntimeError) as e:
+            errors.append(
+                f"Neither {AENEAS_CEW_EXTENSION} nor libespeak-ng is available for in-process synthesis. "
+                "Rebuild aeneas with: AENEAS_WITH_CEW=True pip install aeneas --no-binary :all: "
+                f"or install libespeak-ng (apt-get install libespeak-ng1). Error: {str(e)}"
+            )
+    
     # If any errors, print them and raise an exception
     if errors:
         error_msg = "\n".join([f"  - {error}" for error in errors])
@@ -308,12 +708,31 @@ def check_dependencies():
         raise RuntimeError("Missing required dependencies. See error messages above.")
     
     print("✓ All dependencies verified: ffmpeg, espeak-ng, aeneas")
+    print("✓ aeneas C extensions verified: " + ", ".join(AENEAS_C_EXTENSIONS))
+    if use_cew:
+        print(f"✓ espeak wrapper: Has C extension call? {has_c_extension_call} (synthesis runs in-process via aeneas.cew)")
+    else:
+        print("✓ aeneas.cew not available; espeak-ng synthesis runs in-process via libespeak-ng (ctypes)")
 
 
 @app.on_event("startup")
 async def startup_event():
     """Run dependency checks when the server starts."""
     check_dependencies()
+    os.makedirs(AENEAS_TMP_PATH, exist_ok=True)
+    # Shared HTTP client so connections are pooled across requests
+    app.state.http = httpx.AsyncClient(follow_redirects=True)
+    # Alignment results keyed by (audio digest, lyrics digest)
+    app.state.alignment_cache = diskcache.Cache(CACHE_DIR, size_limit=CACHE_MAX_BYTES)
+    app.state.aeneas_pool = create_aeneas_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release resources created at startup."""
+    await app.state.http.aclose()
+    app.state.alignment_cache.close()
+    app.state.aeneas_pool.shutdown(wait=False, cancel_futures=True)
 
 
 @app.get("/")